@@ -1,13 +1,23 @@
-import datetime
+import errno
 import logging as logging
 import os.path
 import threading
 import hashlib
 import time
 import shutil
-from datetime import timedelta
+import stat
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from logging.handlers import TimedRotatingFileHandler
 from logging import StreamHandler
+from typing import Iterator, Tuple
+from inotify_watcher import InotifyWatcher
+
+# files of at least this size are read with sequential access hint when copied
+FADVISE_THRESHOLD = 16 << 20
+# maximal number of bytes requested from a single os.copy_file_range call
+COPY_CHUNK_SIZE = 1 << 30
+# maximal number of files queued for comparison and copying per worker thread
+PENDING_FILES_PER_WORKER = 4
 
 
 class FileSynchronizer:
@@ -15,35 +25,62 @@ class FileSynchronizer:
     FileSynchronizer is a class, which contains all functions performing synchronization between source and replica
     directories,
     """
-    def __init__(self, source: str, replica: str, logfile: str, period: int):
+    def __init__(self, source: str, replica: str, logfile: str, period: int, watch: bool = False,
+                 console_level: int = logging.WARNING, file_level: int = logging.DEBUG):
         self.logger = None
         self.source_dir = source
         self.replica_dir = replica
         self.period = period
         self.logfile = logfile
+        self.console_level = console_level
+        self.file_level = file_level
+        self.watch = watch
+        self._watcher = None
+        # guards watcher against being closed by run() while stop() wakes it up
+        self._watcher_lock = threading.Lock()
+        # file digests kept between cycles, keyed by path and valid as long as size and mtime stay the same
+        self._hash_cache: dict[str, tuple[int, float, str]] = {}
+        self._stop_event = threading.Event()
 
     def initialize(self) -> None:
         """
-        Function creates logger for logging purposes and replica folder in case the one provided does not exist
+        Function creates logger for logging purposes and replica folder in case the one provided does not exist.
+        If watching is requested, it also registers inotify watches on source directory.
         :return: None
         """
-        self.logger = self.create_logger(self.logfile)
+        self.logger = self.create_logger(self.logfile, self.console_level, self.file_level)
         if not os.path.exists(self.replica_dir):
             os.makedirs(self.replica_dir)
             self.logger.debug(f"Replica directory: [{self.replica_dir}] created.")
 
+        if self.watch:
+            if not InotifyWatcher.is_supported():
+                self.logger.warning("Watching for changes is not supported on this platform, periodic "
+                                    "synchronization is used only.")
+                return
+            try:
+                self._watcher = InotifyWatcher(self.source_dir, self.logger)
+                self.logger.debug(f"Watching source directory: [{self.source_dir}] for changes.")
+            except OSError as e:
+                self.logger.warning(f"Could not watch source directory: [{self.source_dir}], periodic "
+                                    f"synchronization is used only. Error: {e}")
+
     @staticmethod
-    def create_logger(logfile: str) -> logging.Logger:
+    def create_logger(logfile: str, console_level: int = logging.WARNING,
+                      file_level: int = logging.DEBUG) -> logging.Logger:
         """
         Function creates logger for logging purposes with two different handlers, one logging into file, second
         logging into console output.
         :param logfile: A str link for a file where file handler should log events into.
+        :param console_level: Minimal level of events logged into console output.
+        :param file_level: Minimal level of events logged into file.
         :return: logging.Logger object type, ready to be used to log events.
         """
 
         # logger creation, logging level setting and logging format definition
+        # logger level is the lowest of handlers' levels, so events no handler would emit are not even created
         logger = logging.getLogger("folder_synchronizer")
-        logger.setLevel(logging.DEBUG)
+        logger.setLevel(min(console_level, file_level))
         formatter = logging.Formatter(
             '[%(asctime)s] - [%(levelname)s] - %(message)s',
             "%Y-%m-%d %H:%M:%S")
@@ -51,11 +88,13 @@ class FileSynchronizer:
         # file handler creation and its registration to logger
         file_handler = TimedRotatingFileHandler(logfile, when="W0")
         file_handler.setFormatter(formatter)
+        file_handler.setLevel(file_level)
         logger.addHandler(file_handler)
 
         # stream handler (console) creation and its registration to logger
         console_handler = StreamHandler()
         console_handler.setFormatter(formatter)
+        console_handler.setLevel(console_level)
         logger.addHandler(console_handler)
         return logger
 
@@ -63,25 +102,96 @@ class FileSynchronizer:
         """
         Main function for cyclic execution of synchronization between source and replica directories.
         It executes synchronization when last synchronization is complete and was done a defined time (as period) ago.
+        Synchronization is executed directly in the calling thread, no thread is created per cycle. Waiting is done
+        with threading.Event, so the function sleeps until next synchronization is due (or stop is requested) instead
+        of waking up periodically to check elapsed time.
+        When source directory is watched, changes reported by inotify are synchronized as they come, while full
+        synchronization is still executed every period as a fallback for missed events.
         :return: None
-        -----------------------------------------------------------------------
-        Comment:
-            Several different approaches could have also been used:
-            - threading.Time (with its interval parameter)
-            - timeloop library (which generally bases on threading.Timer)
-            - FileSynchronization class could have inherited from threading.Thread and be adjusted for use
-            ...
-        """
-        prev_call_time = datetime.datetime.now()
-        t = threading.Thread(target=self.synchronize_directories)
-        t.start()
-        while True:
-            time.sleep(1)
-            curr_call_time = datetime.datetime.now()
-            if curr_call_time - prev_call_time >= timedelta(seconds=self.period) and not t.is_alive():
-                prev_call_time = curr_call_time
-                t = threading.Thread(target=self.synchronize_directories)
-                t.start()
+        """
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+
+            # a failed synchronization is logged and next cycle is still executed
+            try:
+                self.synchronize_directories()
+            except Exception:
+                self.logger.exception("Synchronization failed.")
+            if self._watcher is not None:
+                self._synchronize_changes(started + self.period)
+            else:
+                self._stop_event.wait(max(0.0, self.period - (time.monotonic() - started)))
+
+        if self._watcher is not None:
+            with self._watcher_lock:
+                self._watcher.close()
+                self._watcher = None
+
+    def stop(self) -> None:
+        """
+        Function requests run loop to finish, once currently performed synchronization (if any) is complete.
+        :return: None
+        """
+        self._stop_event.set()
+        with self._watcher_lock:
+            if self._watcher is not None:
+                self._watcher.wakeup()
+
+    def _synchronize_changes(self, deadline: float) -> None:
+        """
+        Function synchronizes changes reported by inotify until deadline (time of next full synchronization) passes.
+        :param deadline: time.monotonic() value until which changes are to be watched
+        :return: None
+        """
+        while not self._stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            changes = self._watcher.read_changes(remaining)
+            if changes is None:
+                self.logger.warning("Some changes in source directory were lost, full synchronization is performed.")
+                return
+            if changes:
+                # like in run loop, a failed synchronization is logged and watching continues
+                try:
+                    self.synchronize_paths(changes)
+                except Exception:
+                    self.logger.exception("Synchronization of changed paths failed.")
+
+    def synchronize_paths(self, paths) -> None:
+        """
+        Function performing synchronization of selected source paths only. Existing files are updated, existing
+        directories are synchronized with all their content and paths missing in source are removed from replica.
+        :param paths: iterable of changed absolute paths in source directory
+        :return: None
+        """
+        items_to_sync = []
+        items_to_verify = []
+        source_prefix = os.path.join(self.source_dir, "")
+        replica_prefix = os.path.join(self.replica_dir, "")
+        synced_dirs = ()
+        # sorting places directories before their content, so content of already handled directories is skipped
+        for source_path in sorted(paths):
+            if source_path.startswith(synced_dirs):
+                continue
+            relative_path = source_path[len(source_prefix):]
+            replica_path = replica_prefix + relative_path
+
+            # symlinks to directories are handled as in full synchronization, i.e. as directories not descended into
+            if os.path.isdir(source_path) and not os.path.islink(source_path):
+                items_to_sync.append((source_path, True))
+                items_to_sync.extend(self.fetch_files_and_dirs(source_path))
+                items_to_verify.extend(self.fetch_files_and_dirs(replica_path))
+                synced_dirs += (source_path + os.sep,)
+            elif os.path.isdir(source_path):
+                items_to_sync.append((source_path, True))
+            elif os.path.exists(source_path):
+                items_to_sync.append((source_path, False))
+            else:
+                items_to_verify.append((replica_path, os.path.isdir(replica_path)))
+
+        self.update_replica(items_to_sync)
+        self.cleanup_replica(items_to_verify)
 
     def synchronize_directories(self) -> None:
         """
@@ -90,68 +200,149 @@ class FileSynchronizer:
                 are missing in replica directory or if (in case of files) they do exist but differ
             Step2: gathers all items in replica directory and performs check if any of these items
                 are not found in source directory - deletes them in replica as redundancy
+            Replica directory is walked through in background while Step1 is performed, so both walks overlap.
+            Items copied to replica in Step1 exist in source, thus missing them in that walk does not matter.
         :return:
         """
-        # Step1
-        items_to_sync = self.fetch_files_and_dirs(self.source_dir)
-        self.update_replica(items_to_sync)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            replica_walk = executor.submit(self.fetch_files_and_dirs_parallel, self.replica_dir)
 
-        #Step2:
-        items_to_verify = self.fetch_files_and_dirs(self.replica_dir)
-        self.cleanup_replica(items_to_verify)
+            # Step1, relative paths of all source items are collected so Step2 does not need to stat source
+            # Directories which could not be listed are collected too, as their content is missing in source_paths
+            source_paths = set()
+            unlisted_dirs = []
+            items_to_sync = self.fetch_files_and_dirs(self.source_dir, unlisted_dirs)
+            self.update_replica(items_to_sync, source_paths)
+            for directory in unlisted_dirs:
+                self.logger.warning(f"Could not list source directory: [{directory}], its content is not synchronized.")
+
+            #Step2:
+            items_to_verify = replica_walk.result()
+            self.cleanup_replica(items_to_verify, source_paths, unlisted_dirs)
 
-    def update_replica(self, items_to_sync) -> None:
+    def update_replica(self, items_to_sync, source_paths=None) -> None:
         """
         Function performing synchronization of items from source directory to replica directory, creating missing
-        directories and copying missing files.
-        :param items_to_sync: complete list of items from source directory, containing absolute paths
+        directories and copying missing files. Directories are created serially as they are walked through, files are
+        handed over to a thread pool to be compared and copied, as these operations are independent and mostly I/O-bound.
+        :param items_to_sync: iterable of (path, is_dir) items from source directory, containing absolute paths, each
+            directory preceding its content
+        :param source_paths: optional set, to which relative paths of all items from source directory are added
         :return: None
         """
-        # For better performance check is done as one pass through all items in the list
-        for source_path in items_to_sync:
-            relative_path = os.path.relpath(source_path, self.source_dir)
-            replica_path = os.path.join(self.replica_dir, relative_path)
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for paths in self._prepare_replica(items_to_sync, source_paths):
+
+                # number of files in flight is bounded, so memory does not grow with the number of files walked
+                if len(pending) >= max_workers * PENDING_FILES_PER_WORKER:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._check_results(done)
+                pending.add(executor.submit(self._sync_one_file, paths))
+            done, _ = wait(pending)
+            self._check_results(done)
+
+    @staticmethod
+    def _check_results(futures) -> None:
+        """
+        Function retrieves results of completed futures, so exceptions raised in workers are not silently dropped.
+        :param futures: iterable of completed futures
+        :return: None
+        """
+        for future in futures:
+            future.result()
+
+    def _prepare_replica(self, items_to_sync, source_paths=None):
+        """
+        Function creates directories missing in replica and yields files to be synchronized, so they can be processed
+        while the source directory is still being walked through.
+        :param items_to_sync: iterable of (path, is_dir) items from source directory
+        :param source_paths: optional set, to which relative paths of all items are added
+        :return: generator of (source_path, replica_path) tuples for files
+        """
+        # all walked paths start with source directory, so relative path is obtained by stripping it, which is
+        # much cheaper than os.path.relpath
+        source_prefix = os.path.join(self.source_dir, "")
+        replica_prefix = os.path.join(self.replica_dir, "")
+        for source_path, is_dir in items_to_sync:
+            relative_path = source_path[len(source_prefix):]
+            replica_path = replica_prefix + relative_path
+            if source_paths is not None:
+                source_paths.add(relative_path)
 
             # Check if the item to sync is a directory and if it does not exist in replica, create it
-            if os.path.isdir(source_path):
-                if not os.path.exists(replica_path):
-                    try:
-                        os.makedirs(replica_path)
+            # Parent directories precede their content, so a single mkdir call both checks and creates the directory
+            if is_dir:
+                try:
+                    os.mkdir(replica_path)
+                    if self.logger.isEnabledFor(logging.DEBUG):
                         self.logger.debug(f"Directory [{replica_path}] created.")
-                    except PermissionError as e:
-                        self.logger.warning(f"Could not create directory: [{replica_path}]. Permission error: {e}")
-
-            # If item to sync is file and if it does not exist in replica or differs from the one in source, copy it
-            # Although generation and comparison of md5 has been implemented, filecmp library could have also been used
+                except FileExistsError:
+                    pass
+                except PermissionError as e:
+                    self.logger.warning(f"Could not create directory: [{replica_path}]. Permission error: {e}")
+                except FileNotFoundError as e:
+                    self.logger.warning(f"Could not create directory: [{replica_path}]. Parent directory missing: {e}")
             else:
-                if not os.path.exists(replica_path) or not self.files_equal(source_path, replica_path):
-                    try:
-                        shutil.copy2(source_path, replica_path)
-                        self.logger.debug(f"File [{replica_path}] copied from [{source_path}]")
-                    except PermissionError as e:
-                        self.logger.warning(f"Could not copy file: [{replica_path}]. Permission error: {e}")
+                yield source_path, replica_path
+
+    def _sync_one_file(self, paths) -> None:
+        """
+        Function copies a single file from source to replica if it does not exist in replica or differs from the one
+        in source.
+        :param paths: tuple of (source_path, replica_path)
+        :return: None
+        """
+        source_path, replica_path = paths
+        try:
+            if self._needs_copy(source_path, replica_path):
+                self.copy_file(source_path, replica_path)
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(f"File [{replica_path}] copied from [{source_path}]")
+        except PermissionError as e:
+            self.logger.warning(f"Could not copy file: [{replica_path}]. Permission error: {e}")
+        except shutil.SpecialFileError as e:
+            self.logger.warning(f"Could not copy file: [{replica_path}]. Not a regular file: {e}")
+        except OSError as e:
+            self.logger.warning(f"Could not copy file: [{replica_path}]. Error: {e}")
 
-    def cleanup_replica(self, items_to_verify) -> None:
+    def cleanup_replica(self, items_to_verify, source_paths=None, unlisted_dirs=()) -> None:
         """
         Function performing synchronization of items in replica directory in reference to source directory, removing
         items that are redundant (not found in source directory).
-        :param items_to_verify: complete list of items from replica directory, containing absolute paths
+        :param items_to_verify: iterable of (path, is_dir) items from replica directory, containing absolute paths
+        :param source_paths: optional set of relative paths of all items in source directory; if not given, existence
+            of each item in source directory is checked on disk
+        :param unlisted_dirs: source directories which could not be listed when gathering source_paths; existence of
+            items under them is checked on disk, as they are missing in source_paths
         :return: None
         """
-        for replica_path in items_to_verify:
-            relative_path = os.path.relpath(replica_path, self.replica_dir)
-            source_path = os.path.join(self.source_dir, relative_path)
+        # all walked paths start with replica directory, so relative path is obtained by stripping it
+        source_prefix = os.path.join(self.source_dir, "")
+        replica_prefix = os.path.join(self.replica_dir, "")
+        unlisted_prefixes = tuple(os.path.join(directory, "") for directory in unlisted_dirs)
+        removed_paths = []
+        for replica_path, is_dir in items_to_verify:
+            relative_path = replica_path[len(replica_prefix):]
+            source_path = source_prefix + relative_path
 
             # Check if item does not exist in source directory and still exists in replica directory because whole
             # directory removal might remove all items under specific directory, thus further removal of its items
             # is not possible
-            if not os.path.exists(source_path) and os.path.exists(replica_path):
+            if source_paths is not None and not source_path.startswith(unlisted_prefixes):
+                in_source = relative_path in source_paths
+            else:
+                in_source = os.path.exists(source_path)
+            if not in_source and os.path.exists(replica_path):
 
                 # in case of folder redundancy shutil library is used
-                if os.path.isdir(replica_path):
+                if is_dir:
                     try:
                         shutil.rmtree(replica_path)
-                        self.logger.debug(f"Directory [{replica_path}] removed.")
+                        removed_paths.extend((replica_path, source_path))
+                        if self.logger.isEnabledFor(logging.DEBUG):
+                            self.logger.debug(f"Directory [{replica_path}] removed.")
                     except PermissionError as e:
                         self.logger.warning(f"Could not remove directory: [{replica_path}]. Permission error: {e}.")
 
@@ -159,54 +350,219 @@ class FileSynchronizer:
                 else:
                     try:
                         os.remove(replica_path)
-                        self.logger.debug(f"File [{replica_path}] removed.")
+                        removed_paths.extend((replica_path, source_path))
+                        if self.logger.isEnabledFor(logging.DEBUG):
+                            self.logger.debug(f"File [{replica_path}] removed.")
                     except PermissionError as e:
                         self.logger.warning(f"Could not remove file: [{replica_path}]. Permission error: {e}.")
 
-    def files_equal(self, l, r) -> bool:
+        self._forget_digests(removed_paths)
+
+    def _needs_copy(self, src, dst) -> bool:
         """
-        Function checks if files are equal using generated md5 hash
-        :param l: left file object
-        :param r: right file object
-        :return: bool value pointing if both files equal or not
+        Function checks if file in replica has to be (re)copied from source, i.e. if it is missing in replica or differs.
+        Files with equal size and modification time are considered equal without reading them, otherwise files of
+        equal size are compared by their digests, which are cached between cycles.
+        :param src: path to a file in source directory
+        :param dst: path to a file in replica directory
+        :return: bool value pointing if file has to be copied or not
         """
-        if self.generate_md5(l) == self.generate_md5(r):
+        # a single stat both checks replica file existence and provides its signature
+        try:
+            dst_stat = os.stat(dst)
+        except FileNotFoundError:
+            return True
+        src_stat = os.stat(src)
+        if src_stat.st_size != dst_stat.st_size:
             return True
-        return False
+        if src_stat.st_mtime == dst_stat.st_mtime:
+            return False
+        return self.cached_digest(src, src_stat) != self.cached_digest(dst, dst_stat)
+
+    def cached_digest(self, path, stat=None) -> str:
+        """
+        Function returns digest of a file, reusing the one generated in previous cycles if file size and modification
+        time did not change since.
+        :param path: Path to a file for which digest is to be returned.
+        :param stat: os.stat_result of the file, if already known, to avoid stating it again
+        :return: digest in hex str format.
+        """
+        if stat is None:
+            stat = os.stat(path)
+        cached = self._hash_cache.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+            return cached[2]
+        digest = self.generate_digest(path)
+        self._hash_cache[path] = (stat.st_size, stat.st_mtime, digest)
+        return digest
+
+    def _forget_digests(self, paths) -> None:
+        """
+        Function drops cached digests of removed files and of all files under removed directories.
+        :param paths: list of removed paths
+        :return: None
+        """
+        if not paths or not self._hash_cache:
+            return
+        prefixes = tuple(p + os.sep for p in paths)
+        removed = set(paths)
+        for path in list(self._hash_cache):
+            if path in removed or path.startswith(prefixes):
+                del self._hash_cache[path]
+
+    @staticmethod
+    def copy_file(src, dst) -> None:
+        """
+        Function copies file content and metadata, like shutil.copy2. Where available (Linux), os.copy_file_range is
+        used so the kernel copies data without passing it through user space; if it is not supported for given files
+        (e.g. different file systems on older kernels) shutil.copyfile is used, which itself prefers os.sendfile.
+        :param src: path to a file to be copied
+        :param dst: path where file is to be copied to
+        :return: None
+        """
+        # special files (e.g. named pipes) are not copied, opening them might block forever
+        src_stat = os.stat(src)
+        if not stat.S_ISREG(src_stat.st_mode):
+            raise shutil.SpecialFileError(f"[{src}] is not a regular file")
+
+        copied = False
+        if hasattr(os, "copy_file_range"):
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+
+                # hint sequential access for big files so kernel reads ahead aggressively
+                if hasattr(os, "posix_fadvise") and src_stat.st_size >= FADVISE_THRESHOLD:
+                    os.posix_fadvise(fsrc.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                try:
+                    while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK_SIZE):
+                        copied = True
+                except OSError as e:
+                    if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                        raise
+
+            # some kernels return 0 from the first call without copying anything, like shutil does, it is treated
+            # as not supported unless the file is really empty
+            if not copied and src_stat.st_size == 0:
+                copied = True
+        if not copied:
+            shutil.copyfile(src, dst)
+        shutil.copystat(src, dst)
 
     @staticmethod
-    def fetch_files_and_dirs(directory) -> list:
+    def fetch_files_and_dirs(directory, unlisted_dirs=None) -> Iterator[Tuple[str, bool]]:
         """
-        Function gathering all items under a directory using os.walk function.
+        Function lazily gathering all items under a directory using os.scandir function.
         :param directory: Contains absolute path to a directory to gather its children elements
-        :return: list of all children of a directory.
+        :param unlisted_dirs: optional list, to which directories that could not be listed are appended
+        :return: generator of (path, is_dir) tuples for all children of a directory, each directory preceding its
+            content.
         """
-        items_to_sync = []
-        for root, dirs, files in os.walk(directory):
+        return FileSynchronizer._scan_tree(directory, unlisted_dirs)
 
-            # concatenates root directory with all subdirectories walked through
-            for d in dirs:
-                items_to_sync.append(os.path.join(root, d))
+    @staticmethod
+    def fetch_files_and_dirs_parallel(directory) -> list:
+        """
+        Function gathering all items under a directory into a list. Top-level subdirectories are walked through in
+        parallel, each in its own thread, to overlap directory listing latency of wide trees. It is meant for walks
+        that are materialized anyway, the lazy fetch_files_and_dirs is to be used otherwise.
+        :param directory: Contains absolute path to a directory to gather its children elements
+        :return: list of (path, is_dir) tuples for all children of a directory, each directory preceding its content.
+        """
+        items = []
+        subdirs = []
+        for entry in FileSynchronizer._list_directory(directory):
+            is_dir, descend = FileSynchronizer._classify_entry(entry)
+            items.append((entry.path, is_dir))
+            if descend:
+                subdirs.append(entry.path)
+        if not subdirs:
+            return items
 
-            # concatenates root directory with all files walked through
-            for f in files:
-                items_to_sync.append(os.path.join(root, f))
+        with ThreadPoolExecutor(max_workers=min(len(subdirs), os.cpu_count() or 1)) as executor:
+            for subtree_items in executor.map(FileSynchronizer._walk_subtree, subdirs):
+                items.extend(subtree_items)
+        return items
 
-        return items_to_sync
+    @staticmethod
+    def _walk_subtree(directory) -> list:
+        """
+        Function gathering all items under a directory in a single thread.
+        :param directory: Contains absolute path to a directory to walk through
+        :return: list of (path, is_dir) tuples
+        """
+        return list(FileSynchronizer._scan_tree(directory))
 
     @staticmethod
-    def generate_md5(path, chunk_size=4096) -> str:
+    def _scan_tree(directory, unlisted_dirs=None):
+        """
+        Function recursively yields items under a directory. is_dir flag comes from os.DirEntry, which caches it from
+        the directory listing, so no additional stat is needed per item. Like os.walk, symlinks to directories are
+        reported as directories but are not descended into.
+        :param directory: Contains absolute path to a directory to walk through
+        :param unlisted_dirs: optional list, to which directories that could not be listed are appended
+        :return: generator of (path, is_dir) tuples
         """
-        Function generates md5 hash using hashlib library for a file.
-        :param path: Path to a file for which md5 is to be generated.
+        for entry in FileSynchronizer._list_directory(directory, unlisted_dirs):
+            is_dir, descend = FileSynchronizer._classify_entry(entry)
+            yield entry.path, is_dir
+            if descend:
+                yield from FileSynchronizer._scan_tree(entry.path, unlisted_dirs)
+
+    @staticmethod
+    def _classify_entry(entry) -> Tuple[bool, bool]:
+        """
+        Function checks if directory entry is a directory and if it should be descended into. Like in os.walk, errors
+        (e.g. symlink loops or broken permissions) make the entry to be treated as a file and symlinks to directories
+        are not descended into.
+        :param entry: os.DirEntry object to be checked
+        :return: tuple of (is_dir, descend) bool values
+        """
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            return False, False
+        try:
+            is_symlink = entry.is_symlink()
+        except OSError:
+            is_symlink = False
+        return True, not is_symlink
+
+    @staticmethod
+    def _list_directory(directory, unlisted_dirs=None) -> list:
+        """
+        Function lists direct children of a directory. Like os.walk, directories which cannot be listed are skipped.
+        :param directory: Contains absolute path to a directory to list
+        :param unlisted_dirs: optional list, to which the directory is appended if it could not be listed
+        :return: list of os.DirEntry objects
+        """
+        try:
+            with os.scandir(directory) as it:
+                return list(it)
+        except OSError:
+            if unlisted_dirs is not None:
+                unlisted_dirs.append(directory)
+            return []
+
+    @staticmethod
+    def generate_digest(path, chunk_size=1 << 20) -> str:
+        """
+        Function generates content digest of a file using BLAKE2b from hashlib library. Digest is meant for equality
+        checks only, so a fast non-legacy hash is used instead of md5.
+        :param path: Path to a file for which digest is to be generated.
         :param chunk_size: Chunk by which file content is read. It ts done in chunks to prevent memory overflow in case
             of very big files
-        :return: md5 hash in str format.
+        :return: digest in hex str format.
         """
-        md5_hash = hashlib.md5()
+        file_hash = hashlib.blake2b()
         with open(path, "rb") as f:
-            chunk = f.read(chunk_size)
-            while chunk:
-                md5_hash.update(chunk)
-                chunk = f.read(chunk_size)
-        return md5_hash.hexdigest()
\ No newline at end of file
+
+            # a single buffer is reused for all chunks, so no new bytes object is allocated per read; files are read
+            # rather than memory-mapped, as truncation of a mapped file during hashing would crash the interpreter
+            buffer = bytearray(max(1, min(chunk_size, os.fstat(f.fileno()).st_size)))
+            view = memoryview(buffer)
+            size = f.readinto(buffer)
+            while size:
+                file_hash.update(view[:size])
+                size = f.readinto(buffer)
+        return file_hash.hexdigest()
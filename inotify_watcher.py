@@ -0,0 +1,183 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+
+# inotify event masks, as defined in <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+# file content changes are reported by IN_CLOSE_WRITE only, so files are not copied while still being written
+WATCH_MASK = (IN_CREATE | IN_CLOSE_WRITE | IN_ATTRIB | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+# struct inotify_event header: int wd, uint32_t mask, uint32_t cookie, uint32_t len
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    InotifyWatcher is a class, which watches a directory tree recursively using Linux inotify and reports paths that
+    changed, so they can be synchronized without walking through the whole tree.
+    """
+    def __init__(self, directory: str, logger: logging.Logger = None):
+        self.directory = directory
+        self.logger = logger or logging.getLogger(__name__)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._watches = {}
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        # descriptors are released if watcher cannot be fully initialized, as close() will never be called then
+        try:
+            self._wakeup_read, self._wakeup_write = os.pipe()
+        except BaseException:
+            os.close(self._fd)
+            raise
+        try:
+            self.add_watches(directory)
+        except BaseException:
+            self.close()
+            raise
+
+    @staticmethod
+    def is_supported() -> bool:
+        """
+        Function checks if inotify can be used on current platform.
+        :return: bool value pointing if inotify is supported or not
+        """
+        return sys.platform.startswith("linux")
+
+    def add_watches(self, directory: str) -> None:
+        """
+        Function registers watches for a directory and all its subdirectories. Subdirectories that disappear in
+        the meantime are skipped.
+        :param directory: Contains absolute path to a directory to be watched
+        :return: None
+        """
+        self._add_watch(directory)
+        for root, dirs, _ in os.walk(directory):
+            for d in dirs:
+                path = os.path.join(root, d)
+                if not os.path.islink(path):
+                    self._add_watch(path)
+
+    def _add_watch(self, path: str) -> None:
+        """
+        Function registers watch for a single directory.
+        :param path: Contains absolute path to a directory to be watched
+        :return: None
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return
+            raise OSError(err, os.strerror(err), path)
+        self._watches[wd] = path
+
+    def _remove_watches(self, directory: str) -> None:
+        """
+        Function unregisters watches of a directory (removed or moved away) and all its subdirectories.
+        :param directory: Contains absolute path to a directory which is no longer to be watched
+        :return: None
+        """
+        prefix = directory + os.sep
+        for wd, path in list(self._watches.items()):
+            if path == directory or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def read_changes(self, timeout: float):
+        """
+        Function waits for changes in watched tree and returns paths that changed. Watches for newly created or
+        moved in directories are registered on the fly.
+        :param timeout: maximal time to wait for changes, in seconds
+        :return: set of changed absolute paths (empty if none changed before timeout or wakeup was requested) or None
+            if kernel event queue overflowed and events were lost, in which case full synchronization is needed.
+        """
+        readable, _, _ = select.select([self._fd, self._wakeup_read], [], [], timeout)
+        if self._wakeup_read in readable:
+            os.read(self._wakeup_read, 4096)
+        changes = set()
+        overflow = False
+
+        # all events already queued are read at once, so bursts of changes are handled together
+        while self._fd in readable:
+            buffer = os.read(self._fd, 65536)
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, name_len = EVENT_HEADER.unpack_from(buffer, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(buffer[offset:offset + name_len].rstrip(b"\0"))
+                offset += name_len
+
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                changes.add(path)
+
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._try_add_watches(path)
+                    elif mask & IN_MOVED_FROM:
+                        self._remove_watches(path)
+            readable, _, _ = select.select([self._fd], [], [], 0)
+
+        # directories created while events were lost have no watches yet, so the whole tree is registered again
+        if overflow:
+            self._try_add_watches(self.directory)
+            return None
+        return changes
+
+    def _try_add_watches(self, directory: str) -> None:
+        """
+        Function registers watches like add_watches, but only logs failures (e.g. reached limit of watches), as
+        changes under directories that are not watched are still synchronized by periodic full synchronization.
+        :param directory: Contains absolute path to a directory to be watched
+        :return: None
+        """
+        try:
+            self.add_watches(directory)
+        except OSError as e:
+            self.logger.warning(f"Could not watch directory: [{directory}] for changes, they are synchronized "
+                                f"periodically only. Error: {e}")
+
+    def wakeup(self) -> None:
+        """
+        Function interrupts pending read_changes call, e.g. when synchronization is to be stopped.
+        :return: None
+        """
+        os.write(self._wakeup_write, b"\0")
+
+    def close(self) -> None:
+        """
+        Function releases inotify and wakeup file descriptors.
+        :return: None
+        """
+        os.close(self._fd)
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+        self._watches.clear()
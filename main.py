@@ -47,6 +47,9 @@ def parse_args():
     parser.add_argument(
         "--period", "-p", type =int, default=300,
         help="Synchronization time period, default 300 seconds")
+    parser.add_argument(
+        "--watch", "-w", action="store_true",
+        help="Synchronize changes as they happen (Linux inotify), full synchronization is still done every period")
     return parser.parse_args()
 
 
@@ -54,6 +57,6 @@ if __name__ == "__main__":
     args = parse_args()
     if not validate_args(args):
         sys.exit()
-    fs = FileSynchronizer(args.source, args.replica, args.logfile, args.period)
+    fs = FileSynchronizer(args.source, args.replica, args.logfile, args.period, args.watch)
     fs.initialize()
     fs.run()
\ No newline at end of file